@@ -3,7 +3,13 @@
 # spat_show_all_frames.py  # filename (just informational)
 # Shows a card for YOUR lane: current light, next light, and time-to-change.  # overview
 
-import argparse, time, xml.etree.ElementTree as ET, os, sys  # stdlib imports used below
+import argparse, time, xml.etree.ElementTree as ET, os, sys, math, mmap, queue, threading, functools, contextlib  # stdlib imports used below
+from typing import NamedTuple, Optional  # light record type for per-frame signal-group state
+from xml.parsers import expat         # C-level SAX tokenizer used for the log stream
+try:
+    import numpy as np                # optional: vectorised countdowns for --offline
+except ImportError:
+    np = None
 
 # ---------- terminal colors ----------
 RESET = "\033[0m"                      # ANSI code: reset styles
@@ -16,8 +22,13 @@ FG = {                                 # ANSI foreground color codes
 }
 def colorize(txt, c):                  # colorize a string with color c
     return FG.get(c, "") + txt + RESET
-def clear_screen():                    # clear terminal screen cross-platform
-    os.system("cls" if os.name == "nt" else "clear")
+CLEAR = "\033[H\033[2J"                # ANSI: cursor home + erase screen
+_vt_ready = os.name != "nt"            # Windows consoles need ANSI (VT) mode switched on once
+def enable_ansi():                     # make sure CLEAR/colors render (no subprocess per frame)
+    global _vt_ready
+    if not _vt_ready:
+        os.system("")                  # any shell call leaves the Windows console in VT mode
+        _vt_ready = True
 
 # ---------- small XML helpers ----------
 def first(el, path):                   # get text of the first of something in a path, or None
@@ -27,23 +38,13 @@ def first(el, path):                   # get text of the first of something in a
 def findall(el, path):                 # get every instance of something in a path (empty list if none)
     return el.findall(path) or []
 
-def num_in_node_or_kids(node):         # find first integer text in node or descendants
-    if node is None:                   # if no node found, no number is returned
+def int_text(t):                       # int value of element text, or None if it isn't a plain number
+    if not t:
         return None
-    if node.text and node.text.strip().isdigit():  # is the node text a digit?
-        return int(node.text.strip())  # convert node text to an int value and return it
-    for sub in node.iter():            # check descendants
-        if sub is not node and sub.text and sub.text.strip().isdigit():  # is the subnode text a digit?
-            return int(sub.text.strip())  # convert node text to an int value and return it
-    return None                        # nothing found
-
-def num_at_any(el, paths):             # try many paths and return first numeric value
-    for p in paths:                    # going through every possible path
-        n = el.find(p)                 # find node at path
-        v = num_in_node_or_kids(n)     # pull first integer from that node or its kids
-        if v is not None:              # if found
-            return v                   # return it
-    return None                        # return None if none of the paths had integers
+    if t.isdigit():                    # common case: clean digits, no strip() copy needed
+        return int(t)
+    t = t.strip()                      # pretty-printed XML: surrounding whitespace
+    return int(t) if t.isdigit() else None
 
 # Map J2735 event-state names to simple colors used by the UI
 EVENT2COLOR = {
@@ -56,29 +57,19 @@ EVENT2COLOR = {
     "stop-Then-Proceed":"red",                # red (flashing/stop-then-go)
     "dark":"red",                             # treat dark as red for safety
 }
+EVENT2COLOR = {sys.intern(k): v for k, v in EVENT2COLOR.items()}  # canonical key objects: lookups hit on identity
 
 DEBUG_TIMING = False                  # print raw timing for debugging when True
 
 # =========================================================
 #                       MAP
 # =========================================================
-def parse_map_blocks(text):           # extract all <MapData>...</MapData> chunks
-    blocks, start = [], 0             # list to fill + scanning index
-    while True:                       # loop until no more blocks
-        i = text.find("<MapData>", start)     # find next start tag
-        if i == -1: break             # if none found, break
-        j = text.find("</MapData>", i)        # find matching end tag
-        if j == -1: break             # if none found, break
-        blocks.append(text[i:j+len("</MapData>")])  # slice the block
-        start = j + len("</MapData>") # move cursor past this block
-    return blocks                     # return list of MAP XML strings
-
-def parse_map(md_xml):                # parse ONE MapData block
+def parse_map(root, only_lane=None):  # parse ONE MapData element
     """
     Returns (inter_id, inter_name, lanes)
       lanes: { lane_id(int) : {"sg": signalGroup (int or None)} }
+    With only_lane, other lanes are still listed but get {} (their connections aren't read).
     """
-    root = ET.fromstring(md_xml)      # parse XML into a tree
     ig = root.find(".//intersections/IntersectionGeometry")  # main MAP body
     if ig is None:                    # missing MAP content?
         return None, None, {}         # return empty info
@@ -94,6 +85,9 @@ def parse_map(md_xml):                # parse ONE MapData block
             lid = int(lid_txt)        # convert to int
         except ValueError:
             continue                  # if non-numeric, skip
+        if only_lane is not None and lid != only_lane:
+            lanes[lid] = {}           # known lane, SG not needed
+            continue
 
         sg = None                     # start off assuming no SG
         for ct in findall(gl, "connectsTo/Connection"):  # check lane connections
@@ -110,31 +104,11 @@ def parse_map(md_xml):                # parse ONE MapData block
 # =========================================================
 #                       SPaT
 # =========================================================
-def parse_spat_blocks(text):          # extract all <SPAT>...</SPAT> chunks
-    blocks, start = [], 0             # list + scan index
-    while True:                       # loop through file
-        i = text.find("<SPAT>", start)        # next SPaT start
-        if i == -1: break             # if none found, break
-        j = text.find("</SPAT>", i)           # end tag
-        if j == -1: break             # if none found, break
-        blocks.append(text[i:j+len("</SPAT>")])  # slice block
-        start = j + len("</SPAT>")    # advance cursor
-    return blocks                     # return list of SPaT XML strings
-
-def extract_now_value(spat):          # find device's current time counter (inside SPaT)
+def pick_now(ts, moy):                # device's current time counter (from the SPaT's timeStamp / moy)
     """
     Try common counters (msecOfMin, dSecond, moy). Prefer per-minute values.
     """
-    candidates = []                   # possible counters found
-    ts = num_at_any(spat, [           # look for timestamp fields
-        ".//timeStamp", ".//timeStamp/msecOfMin", ".//msecOfMin",
-        ".//timeStamp/dSecond", ".//dSecond"
-    ])
-    if ts is not None:
-        candidates.append(ts)         # add candidate if found
-    moy = num_at_any(spat, [".//moy"])  # minute-of-year (some devices)
-    if moy is not None:
-        candidates.append(moy)        # add candidate if found
+    candidates = [v for v in (ts, moy) if v is not None]  # possible counters found
     if not candidates:
         return None                   # nothing usable
 
@@ -143,77 +117,24 @@ def extract_now_value(spat):          # find device's current time counter (insi
             return v                  # return that value
     return candidates[0]              # else return first candidate
 
-def parse_spat(spat_root):            # parse ONE SPaT block
-    # find SPaT node even if nested under other wrappers
-    spat = spat_root if spat_root.tag == "SPAT" else (spat_root.find(".//SPAT") or spat_root.find(".//value/SPAT"))
-    if spat is None:
-        return None, None, []         # if no SPaT found, return None
-
-    inter = spat.find(".//intersections/IntersectionState")  # main per-SG states
-    if inter is None:
-        return None, None, []         # if no IntersectionState found, return None
-
-    inter_id = first(inter, "id/id") or first(inter, "id")  # intersection ID (from SPaT side)
-    now = extract_now_value(spat)     # get current time value from the SPaT element
-
-    def read_event_state(ev_el):      # get textual eventState from a MovementEvent (return None if none found)
-        esn = ev_el.find("eventState")
-        if esn is None:
-            return None
-        kids = list(esn)              # some encoders nest as a single child tag
-        return kids[0].tag if kids else (esn.text.strip() if esn.text else None)
-
-    def read_min_end_any(ev_el):      # get end-time counter from likely spots
-        for parent in ("timing", "timeChangeDetails"):  # first, check these common containers
-            t = ev_el.find(parent)
-            if t is None:
-                continue
-            for tag in ("likelyTime", "minEndTime", "maxEndTime", "endTime"):  # common end-time fields
-                m = num_at_any(t, [tag])   # read number if present
-                if m is not None:
-                    return m               # return first usable one
-        return None                        # none found
-
-    states = []                            # list of SG state dictionaries to return
-    for ms in findall(inter, "states/MovementState"):  # loop through each MovementState (one SG)
-        sg_txt = first(ms, "signalGroup")  # find SG number as text
-        if not sg_txt:
-            continue
-        try:
-            sg = int(sg_txt)               # convert SG text number to an int
-        except ValueError:
-            continue
-
-        events = ms.findall("state-time-speed/MovementEvent")  # find all possible events
-        ev_name, met = None, None          # event name + raw end-time counter
-        chosen = None                      # best MovementEvent to use
+_TIMING_PARENTS = ("timing", "timeChangeDetails")                     # common end-time containers
+_ENDTIME_TAGS   = ("likelyTime", "minEndTime", "maxEndTime", "endTime")  # common end-time fields, in preference order
+_ENDTIME_KEYS   = tuple((p, t) for p in _TIMING_PARENTS for t in _ENDTIME_TAGS)  # lookup order
+_NOW_TAGS       = ("timeStamp", "msecOfMin", "dSecond", "moy")      # time counters inside a SPaT
 
-        for ev_el in events:               # prefer an event that has timing
-            m = read_min_end_any(ev_el)
-            if m is not None:
-                chosen = (ev_el, m)        # pick this one
-                break
-        if chosen is None and events:      # else just take first for the name
-            chosen = (events[0], read_min_end_any(events[0]))
-
-        if chosen:                         # if we picked something
-            ev_el, met = chosen
-            ev_name = read_event_state(ev_el)
-
-        if DEBUG_TIMING:                   # optional debug print
-            print(f"[dbg] sg={sg} state={ev_name} now={now} minEndRaw={met}")
-
-        states.append({"sg": sg, "event": ev_name, "minEndRaw": met})  # record this SG
-
-    return inter_id, now, states           # return SPaT results
+class SGState(NamedTuple):            # one signal group's state in a SPaT frame (a tuple, no per-frame dict)
+    sg: int                           # signal group id
+    event: Optional[str]              # J2735 event-state name
+    minEndRaw: Optional[int]          # raw minEndTime / likelyTime counter
 
 def detect_unit_and_delta(now_val, met_val):  # convert counters to seconds remaining
     """
     Primary guess: now ~ ms-of-minute, end ~ deciseconds-of-minute.
     Fallbacks: try other common wraps/scales (ds, cs, ms, 16-bit wrap).
+    Returns NaN (not None) when a counter is missing, so callers stay float-only.
     """
     if now_val is None or met_val is None:    # if missing data, computation not possible
-        return None
+        return math.nan
 
     # Primary interpretation (common vendor pairing).
     now_sec = (now_val / 1000.0) % 60.0       # ms to seconds within minute
@@ -234,6 +155,363 @@ def detect_unit_and_delta(now_val, met_val):  # convert counters to seconds rema
     best = min(candidates)                     # fallback: lowest of all candidates
     return best % 60.0                         # keep within 0..60
 
+def detect_batch(now_vals, met_vals):         # detect_unit_and_delta over whole lists at once (missing -> NaN)
+    if np is None:
+        return [detect_unit_and_delta(n, m) for n, m in zip(now_vals, met_vals)]
+    now = np.array([math.nan if v is None else v for v in now_vals], dtype=np.float64)  # NaN marks missing
+    met = np.array([math.nan if v is None else v for v in met_vals], dtype=np.float64)
+    # The primary interpretation always lands in 0..60 for real counters, so the fallbacks never run
+    # and the whole thing is one NumPy expression.
+    rem = ((met / 10.0) % 60.0 - (now / 1000.0) % 60.0) % 60.0
+    return rem.tolist()
+
+# =========================================================
+#                    LOG STREAM
+# =========================================================
+CHUNK = 64 * 1024                     # bytes fed to the parser per read
+
+@contextlib.contextmanager
+def _mapped(path):                    # read-only mmap of the whole file (None if empty), paged in by the OS
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield None                # nothing to map
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+_TAG_END = frozenset(b"> \t\r\n")   # bytes that can follow the name in a start tag
+_DECL = b"<?xml"                      # XML declaration / xml-* processing instruction opener
+
+def _find_open(buf, tag, pos):        # index of the next <tag> or <tag attr=...> start tag from pos, or -1
+    want, n = b"<" + tag, len(tag) + 1
+    while True:
+        i = buf.find(want, pos)
+        if i == -1 or (i + n < len(buf) and buf[i + n] in _TAG_END):
+            return i
+        pos = i + 1                   # e.g. <SPATx>: keep looking
+
+def iter_blocks(buf, tag, pos=0):     # each <tag>...</tag> block from pos on, as bytes (bytes or mmap alike)
+    close_tag = b"</" + tag + b">"
+    while True:
+        start = _find_open(buf, tag, pos)  # plain byte search, one pass over the file
+        if start == -1:
+            return
+        end = buf.find(close_tag, start)
+        if end == -1:
+            return                    # truncated last block
+        pos = end + len(close_tag)
+        yield buf[start:pos]
+
+def _read_blanked(f):                 # file chunks with every <?xml ...?> blanked to spaces
+    """
+    Logs are often one XML document per message, each with its own declaration,
+    which is only legal at the very start of a document. Blanking (not cutting)
+    keeps stream offsets equal to file offsets, so recovery can resume from one.
+    """
+    carry = b""
+    while True:
+        data = f.read(CHUNK)
+        buf = bytearray(carry + data)
+        pos = 0
+        while True:
+            i = buf.find(_DECL, pos)
+            if i == -1:
+                break
+            j = buf.find(b"?>", i)
+            if j == -1:
+                break                 # unfinished: held back below
+            buf[i:j + 2] = b" " * (j + 2 - i)
+            pos = j + 2
+        if not data:
+            yield buf                 # end of file: whatever is left
+            return
+        cut = buf.find(_DECL, pos)    # a declaration still open at the end waits for the next chunk...
+        if cut == -1:                 # ...and so does a chunk ending in a piece of "<?xml"
+            cut = buf.rfind(b"<", max(pos, len(buf) - len(_DECL) + 1))
+            if cut != -1 and not _DECL.startswith(buf[cut:]):
+                cut = -1
+        if cut == -1 or len(buf) - cut > 1024:
+            cut = len(buf)            # nothing held back (or not a real declaration: let expat judge it)
+        carry = bytes(buf[cut:])
+        yield buf[:cut]
+
+class LogScanner:                     # event-driven reader for a whole log (MAP + SPaT)
+    """
+    Two passes over the file. First a plain byte search (bytes.find over an
+    mmap, nothing parsed) for the first MapData, which is parsed up front so
+    the lane's signal group is known before any SPaT - logs usually start
+    with SPaT frames, since MAP is broadcast less often. With the MAP near
+    the end that search reads almost the whole file, but at memchr speed
+    (~2% of the expat pass) and it leaves the pages cached for it. Then one
+    expat pass over the file, CHUNK bytes at a time. SPaT frames
+    never become Element trees: a small state machine on the start/end/text
+    callbacks keeps only what the card needs - intersection id, the time
+    counter, and for the lane's signal group the event name + end-time
+    counter. Other signal groups are skipped without decoding. The MapData
+    is the one exception: it's built into a tree for parse_map, since it's
+    read once and the lane lookup needs all of it.
+
+    scan(path) yields
+      ("map",   (inter_id, inter_name, lanes))  for the first MapData (nothing at all if there is none)
+      ("spat",  (inter_id, now, state))         per SPaT in the file, before or after the MAP
+        state: SGState for the lane's SG (event/minEndRaw None if the frame's states
+               don't include it), or None if the frame has no signal-group states at all
+      ("error", message)                        if the file isn't well-formed XML; the rest of
+                                                the log, from just after the last SPaT already
+                                                yielded, is then recovered block by block
+    """
+
+    def __init__(self, lane):
+        self.lane = lane              # lane we're showing
+        self.sg = None                # its signal group, from the MAP
+        self.map_info = None          # parse_map() result for the first MapData
+        self.skip = 0                 # nesting depth inside a skipped subtree or the MAP
+        self._outside = ({"MapData": self._mapdata_start, "SPAT": self._spat_start}, {})
+        self._inside = (              # handlers while inside a <SPAT>
+            {"IntersectionState": self._inter_start, "MovementState": self._ms_start,
+             "MovementEvent": self._ev_start, "eventState": self._evstate_start},
+            {"SPAT": self._spat_end, "IntersectionState": self._inter_end, "id": self._id_end,
+             "signalGroup": self._sg_end, "MovementState": self._ms_end, "MovementEvent": self._ev_end,
+             "eventState": self._evstate_end,
+             **{t: self._counter_end for t in _NOW_TAGS},
+             **{t: self._endtime_end for t in _ENDTIME_TAGS}},
+        )
+        self._reset()
+
+    def _reset(self):                 # fresh expat parser, nothing open
+        self.p = expat.ParserCreate(intern={k: k for k in EVENT2COLOR})  # event tags come back as EVENT2COLOR's own keys
+        self.p.buffer_text = True     # one text callback per run of text
+        self.out = []                 # results waiting for scan() to yield them
+        self.tags = []                # open elements (not counting skipped / MAP subtrees)
+        self.kid_num = []             # per open element: first numeric text among its direct children
+        self.chars = ""               # text of the innermost element so far
+        self.tree = None              # TreeBuilder while inside the first MapData
+        self.spat_done = None         # parser byte index of the last </SPAT> handled
+        self.on_start, self.on_end = self._outside
+        self._normal()
+
+    def scan(self, path):             # generator over the results described above
+        with _mapped(path) as buf:
+            if buf is None or not self._load_map(buf):
+                return                # no usable MapData: the lane can't be resolved
+        yield from self.out           # the "map" result
+        self._reset()
+        try:
+            yield from self._stream(path)
+        except expat.ExpatError as e:
+            yield from self.out       # messages that closed before the bad spot are still good
+            yield "error", f"Malformed XML ({e}); the rest of the log was recovered block by block"
+            done = self.spat_done     # every SPaT up to here has been yielded, even inside an open wrapper
+            yield from self._blocks(path, 0 if done is None else done - len(b"<log>"))  # stream offsets are file offsets past our wrapper
+
+    def _load_map(self, buf):         # parse the first MapData block that parses; True once map_info is set
+        for blob in iter_blocks(buf, b"MapData"):
+            self._reset()
+            try:
+                self.p.Parse(blob, True)
+            except expat.ExpatError:
+                continue              # broken MAP block: try the next one
+            if self.map_info is not None:
+                return True
+        return False
+
+    def _stream(self, path):          # whole file as one document
+        p = self.p
+        p.Parse(b"<log>", False)      # synthetic root so back-to-back messages are one document
+        with open(path, "rb") as f:
+            for chunk in _read_blanked(f):
+                p.Parse(chunk, False)
+                out, self.out = self.out, []
+                yield from out
+        p.Parse(b"</log>", True)
+        yield from self.out
+
+    def _blocks(self, path, pos):     # recovery: parse each SPAT block from pos on alone
+        with _mapped(path) as buf:
+            if buf is None:
+                return
+            for blob in iter_blocks(buf, b"SPAT", pos):
+                self._reset()
+                try:
+                    self.p.Parse(blob, True)
+                except expat.ExpatError:
+                    continue          # skip if bad frame
+                yield from self.out
+
+    # ----- handler sets -----
+    def _normal(self):                # track every element
+        p = self.p
+        p.StartElementHandler, p.EndElementHandler, p.CharacterDataHandler = self._start, self._end, self._data
+
+    def _skip_rest(self):             # ignore everything until the current element closes
+        p = self.p
+        self.skip, self.chars = 0, ""
+        p.StartElementHandler, p.EndElementHandler, p.CharacterDataHandler = self._skip_start, self._skip_end, None
+
+    def _start(self, tag, attrs):
+        self.tags.append(tag)
+        self.kid_num.append(None)
+        self.chars = ""
+        fn = self.on_start.get(tag)
+        if fn:
+            fn(attrs)
+
+    def _end(self, tag):
+        chars, self.chars = self.chars, ""
+        self.tags.pop()
+        kid = self.kid_num.pop()
+        val = int_text(chars)         # own text, else first numeric direct child (like <timeStamp><msecOfMin>)
+        if val is None:
+            val = kid
+        elif self.kid_num and self.kid_num[-1] is None:
+            self.kid_num[-1] = val    # offer it to the parent
+        fn = self.on_end.get(tag)
+        if fn:
+            fn(tag, val, chars)
+
+    def _data(self, text):
+        self.chars += text
+
+    def _skip_start(self, tag, attrs):
+        self.skip += 1
+
+    def _skip_end(self, tag):
+        if self.skip:
+            self.skip -= 1
+        else:                         # the element we were skipping the rest of
+            self._normal()
+            self._end(tag)
+
+    # ----- MAP -----
+    def _mapdata_start(self, attrs):
+        if self.map_info is not None:
+            self._skip_rest()         # already loaded up front; later MAPs are ignored
+            return
+        p = self.p
+        self.tree, self.skip = ET.TreeBuilder(), 0
+        self.tree.start("MapData", attrs)
+        p.StartElementHandler, p.EndElementHandler, p.CharacterDataHandler = self._map_start, self._map_end, self.tree.data
+
+    def _map_start(self, tag, attrs):
+        self.skip += 1
+        self.tree.start(tag, attrs)
+
+    def _map_end(self, tag):
+        self.tree.end(tag)
+        if self.skip:
+            self.skip -= 1
+            return
+        self._normal()                # </MapData>
+        self.tags.pop()
+        self.kid_num.pop()
+        root, self.tree = self.tree.close(), None
+        self.map_info = parse_map(root, only_lane=self.lane)  # parse first MAP (SG only for our lane)
+        lanes = self.map_info[2]
+        if self.lane in lanes:
+            self.sg = lanes[self.lane].get("sg")  # lane's SG
+        self.out.append(("map", self.map_info))
+
+    # ----- SPaT -----
+    def _spat_start(self, attrs):
+        self.on_start, self.on_end = self._inside
+        self.inter = 0                # 0 before, 1 inside, 2 after the first IntersectionState
+        self.inter_id = None          # intersection ID (from SPaT side)
+        self.counters = {}            # first value seen per _NOW_TAGS tag
+        self.state = None             # SGState for our SG
+        self.has_states = False       # any MovementState with a signal group (else the frame isn't shown)
+
+    def _spat_end(self, tag, val, chars):
+        self.on_start, self.on_end = self._outside
+        state = self.state
+        if state is None and self.has_states:
+            state = SGState(self.sg, None, None)  # our SG isn't listed: card shows red, no timing
+        self.out.append(("spat", (self.inter_id, self._now(), state)))
+        self.spat_done = self.p.CurrentByteIndex  # at "</SPAT>": recovery resumes from here
+
+    def _now(self):
+        c = self.counters
+        ts = c.get("timeStamp")
+        if ts is None:
+            ts = c.get("msecOfMin")
+        if ts is None:
+            ts = c.get("dSecond")
+        return pick_now(ts, c.get("moy"))
+
+    def _counter_end(self, tag, val, chars):
+        if val is not None and tag not in self.counters:
+            self.counters[tag] = val
+
+    def _inter_start(self, attrs):
+        if not self.inter:
+            self.inter = 1            # only the first IntersectionState's states are used (its counters still count)
+
+    def _inter_end(self, tag, val, chars):
+        self.inter = 2
+
+    def _id_end(self, tag, val, chars):  # id/id, else id, directly under the IntersectionState
+        t = self.tags
+        if self.inter == 1 and self.inter_id is None and (
+                t[-1] == "IntersectionState" or (t[-1] == "id" and t[-2] == "IntersectionState")):
+            self.inter_id = chars.strip() or None
+
+    def _ms_start(self, attrs):       # one MovementState (one SG)
+        self.ms_sg = None             # its signal group
+        self.first_ev = None          # (event, minEndRaw) of its first MovementEvent
+        self.timed_ev = None          # ... of its first MovementEvent that has timing
+        if self.inter != 1:
+            self._skip_rest()         # not in the first IntersectionState
+
+    def _sg_end(self, tag, val, chars):
+        if self.tags[-1] != "MovementState":
+            return
+        self.ms_sg = int_text(chars)  # SG number
+        if self.ms_sg is not None:
+            self.has_states = True
+        if self.ms_sg is None or (self.ms_sg != self.sg and not DEBUG_TIMING):
+            self._skip_rest()         # not our SG: don't bother decoding it
+
+    def _ev_start(self, attrs):
+        self.ev_name = None           # event name
+        self.ev_times = {}            # (container, tag) -> end-time counter
+
+    def _evstate_start(self, attrs):  # some encoders nest the name as a single child tag
+        self.ev_kid = None
+        self.p.StartElementHandler = self._evkid_start
+
+    def _evkid_start(self, tag, attrs):
+        self.p.StartElementHandler = self._start
+        self.ev_kid = tag
+        self._start(tag, attrs)
+
+    def _evstate_end(self, tag, val, chars):
+        self.p.StartElementHandler = self._start
+        self.ev_name = self.ev_kid if self.ev_kid is not None else (sys.intern(chars.strip()) or None)
+
+    def _endtime_end(self, tag, val, chars):
+        t = self.tags
+        if val is not None and t[-1] in _TIMING_PARENTS and t[-2] == "MovementEvent":
+            self.ev_times.setdefault((t[-1], tag), val)
+
+    def _ev_end(self, tag, val, chars):
+        times = self.ev_times
+        met = next((times[k] for k in _ENDTIME_KEYS if k in times), None)  # raw end-time counter
+        if self.first_ev is None:
+            self.first_ev = (self.ev_name, met)
+        if met is not None and self.timed_ev is None:
+            self.timed_ev = (self.ev_name, met)  # prefer an event that has timing
+
+    def _ms_end(self, tag, val, chars):
+        sg = self.ms_sg
+        if sg is None:
+            return
+        ev_name, met = self.timed_ev or self.first_ev or (None, None)  # event name + raw end-time counter
+        if DEBUG_TIMING:              # optional debug print
+            print(f"[dbg] sg={sg} state={ev_name} now={self._now()} minEndRaw={met}")
+        if sg == self.sg:             # found our SG
+            self.state = SGState(sg, ev_name, met)
+            if not DEBUG_TIMING:
+                self._skip_rest()     # rest of <states>
+
 # ---------- UI helpers ----------
 def color_emoji(c):                            # map color string to emoji dot
     return {"green":"🟢", "yellow":"🟡", "red":"🔴"}.get(c, "⚪")
@@ -244,32 +522,201 @@ def next_color(c):                              # simple light sequence
     if c == "red":    return "green"
     return None
 
+_PRESENT = {                                   # per current color: (current row, start of the "next" row), built once
+    c: (f"{color_emoji(c)}  CURRENT: {c.upper():<6}",
+        f"{color_emoji(next_color(c))}  Changes to {next_color(c).upper():<6}")
+    for c in ("red", "yellow", "green")
+}
+_CUR_W = len(_PRESENT["red"][0])               # every row head is one emoji + fixed text + 6-wide color
+_NXT_W = len(_PRESENT["red"][1])
+
 def draw_card(approach_name, inter_id, lane_id, sg, cur_color, secs_remaining):  # print the card
-    clear_screen()                            # wipe screen for fresh frame
     title = f"Approaching: {approach_name or '—'}  (ID: {inter_id or '—'})"  # header line
-    print(BOLD + title + RESET)               # bold title
-    print()                                   # blank line
-
     header = "On your lane ↑, the next light ⇒"  # subheader
-    print(header)                              # print subheader
-    print()                                    # blank line
-
-    cur = cur_color or "red"                   # default to red if unknown
-    nxt = next_color(cur)                      # guess next color
-    cur_line = f"{color_emoji(cur)}  CURRENT: {cur.upper():<6}"  # current line text
-    if isinstance(secs_remaining, (int, float)):                   # if we have timing
-        nxt_line = f"{color_emoji(nxt)}  Changes to {nxt.upper():<6} in {secs_remaining:0.1f} s"
+
+    cur_line, nxt_head = _PRESENT[cur_color or "red"]  # current line + next color guess (default to red if unknown)
+    if secs_remaining is not None:             # if we have timing
+        secs = f"{secs_remaining:0.1f}"
+        nxt_line = f"{nxt_head} in {secs} s"
+        nxt_w = _NXT_W + len(secs) + 6         # " in " + secs + " s"
     else:                                      # otherwise say "soon"
-        nxt_line = f"{color_emoji(nxt)}  Changes to {nxt.upper():<6} soon"
+        nxt_line = nxt_head + " soon"
+        nxt_w = _NXT_W + 5
+
+    w = max(_CUR_W, nxt_w) + 4                 # box width based on content
+    lines = [
+        BOLD + title + RESET,                   # bold title
+        "",                                     # blank line
+        header,                                 # subheader
+        "",                                     # blank line
+        "┌" + "─"*w + "┐",                      # top border
+        "│ " + cur_line.ljust(w) + " │",        # current line row
+        "│ " + nxt_line.ljust(w) + " │",        # next line row
+        "└" + "─"*w + "┘",                      # bottom border
+        "",                                     # blank line
+        f"(lane {lane_id if lane_id is not None else '—'}, SG {sg if sg is not None else '—'})",  # lane ID and SG meta
+        "",                                     # blank line
+    ]
+    enable_ansi()
+    sys.stdout.write(CLEAR + "\n".join(lines) + "\n")  # wipe + whole frame in one write, so it never tears
+    sys.stdout.flush()
+
+# ---------- parser thread ----------
+def decode_frame(spat):                        # scanner SPaT result -> (inter_id, event, secs) for our SG, or None
+    inter_id_spat, now_val, state = spat
+    if state is None:                          # skip frames with no signal-group states
+        return None
+    rem_secs = detect_unit_and_delta(now_val, state.minEndRaw)  # seconds until change
+    return inter_id_spat, state.event, rem_secs
+
+def _put(q, item, stop):                       # blocking put that gives up once the UI has quit
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
-    w = max(len(cur_line), len(nxt_line)) + 4  # box width based on content
-    print("┌" + "─"*w + "┐")                    # top border
-    print("│ " + cur_line.ljust(w) + " │")      # current line row
-    print("│ " + nxt_line.ljust(w) + " │")      # next line row
-    print("└" + "─"*w + "┘")                    # bottom border
-    print()                                     # blank line
-    print(f"(lane {lane_id if lane_id is not None else '—'}, SG {sg if sg is not None else '—'})")  # print lane ID and SG meta
-    print()                                     # blank line
+def produce(path, lane, q, stop):              # read + parse the log, feeding the UI thread through q
+    """
+    Puts, in order:
+      ("map",   (inter_id, inter_name, lanes))  once, for the first MAP
+      ("frame", (inter_id, event, secs))        per SPaT frame with signal-group states
+      ("error", message)                        if the XML turns malformed part way (frames keep coming)
+      ("fail",  message)                        if the file can't be read or parsing breaks unexpectedly
+      ("done",  spat_seen)                      at the end, always
+    """
+    spat_seen = 0                              # SPaT frames in the log
+    try:
+        for kind, item in LogScanner(lane).scan(path):  # MAP byte search, then one streaming pass over the log
+            if stop.is_set():
+                return
+            if kind == "map":
+                if not _put(q, ("map", item), stop) or lane not in item[2]:
+                    return                     # UI reports a missing lane and quits
+                continue
+            if kind == "error":
+                _put(q, ("error", item), stop)
+                continue
+            spat_seen += 1
+            frame = decode_frame(item)
+            if frame is not None and not _put(q, ("frame", frame), stop):
+                return
+    except OSError as e:                       # file error?
+        _put(q, ("fail", f"Failed to read file: {e}"), stop)
+    except Exception as e:                     # anything else: say so, rather than looking like the end of the log
+        _put(q, ("fail", f"Failed to parse file: {type(e).__name__}: {e}"), stop)
+    finally:
+        _put(q, ("done", spat_seen), stop)     # always sent, so the UI never waits on a dead thread
+
+# ---------- run modes ----------
+def run_live(args):                             # paced playback: parser thread + UI loop
+    """Returns (map_info, spat_seen, shown, notes), or None once it has reported a problem itself."""
+    q = queue.Queue(maxsize=4)                     # parsed frames waiting to be drawn (small: back-pressures the reader)
+    stop = threading.Event()                       # tells the parser thread to quit early
+    threading.Thread(target=produce, args=(args.logfile, args.lane, q, stop), daemon=True).start()
+
+    map_info, my_sg = None, None                   # (inter_id, inter_name, lanes) from the MAP + lane's SG
+    render, map_id = None, None                    # draw_card with the per-run arguments bound, once the MAP is in
+    ev2c = EVENT2COLOR.get                         # event name -> color, bound once
+    last_key = None                                # what the card on screen shows, to skip identical redraws
+    spat_seen = 0                                  # SPaT frames the parser saw
+    notes = []                                     # parser warnings, printed after the last card
+    shown = 0                                      # used to count the frames shown
+    period = max(0.05, args.rate)                  # pause at rate or 0.05 seconds (whichever is greater)
+    next_tick = time.monotonic()                   # deadline for the next frame
+    get, monotonic, sleep = q.get, time.monotonic, time.sleep  # locals: the loop below runs once per frame
+    try:
+        while True:
+            kind, payload = get()
+            if kind == "frame":
+                inter_id_spat, cur_event, rem_secs = payload
+                key = card_key(map_id or inter_id_spat, ev2c(cur_event, "red"), rem_secs)
+                if key != last_key:                          # redraw only when something visible changed
+                    render(                                  # draw out the card for this frame
+                        inter_id=key[0],                     # prefer interID from MAP, else use SPaT's
+                        cur_color=key[1],                    # map event to color (default red)
+                        secs_remaining=key[2],               # seconds (or None)
+                    )
+                    last_key = key
+                shown += 1                                   # go to the next frame
+                next_tick += period                          # parsing overlaps this wait instead of adding to it
+                now = monotonic()
+                if next_tick < now - 1.0:                    # fell far behind (stalled terminal, slow disk): resync
+                    next_tick = now                          # rather than bursting frames to catch up
+                if next_tick > now:
+                    sleep(next_tick - now)
+            elif kind == "map":
+                map_info = payload
+                my_sg = lane_sg(map_info, args.lane)
+                if my_sg is False:
+                    return None
+                render = card_renderer(map_info, args.lane, my_sg)
+                map_id = map_info[0]
+                next_tick = monotonic()                      # frames are paced from here on
+            elif kind == "error":
+                notes.append(payload)                        # the next CLEAR would wipe it; shown at the end
+            elif kind == "fail":
+                print(payload)                               # show reason
+                sys.exit(1)                                  # hard exit
+            else:                                            # "done"
+                spat_seen = payload
+                break
+    finally:
+        stop.set()                                           # let the parser thread exit too
+    return map_info, spat_seen, shown, notes
+
+def run_offline(args):                          # --offline: parse the whole log, one batch countdown pass, no pauses
+    """Returns (map_info, spat_seen, shown, notes), or None once it has reported a problem itself."""
+    map_info, my_sg = None, None
+    spat_seen = 0
+    notes = []
+    inter_ids, events, now_vals, met_vals = [], [], [], []  # one entry per frame to show
+    try:
+        for kind, item in LogScanner(args.lane).scan(args.logfile):
+            if kind == "map":
+                map_info = item
+                my_sg = lane_sg(map_info, args.lane)
+                if my_sg is False:
+                    return None
+            elif kind == "error":
+                notes.append(item)
+            else:
+                spat_seen += 1
+                inter_id_spat, now_val, state = item
+                if state is not None:                # skip frames with no signal-group states
+                    inter_ids.append(inter_id_spat)
+                    events.append(state.event)
+                    now_vals.append(now_val)
+                    met_vals.append(state.minEndRaw)
+    except OSError as e:                             # file error?
+        print(f"Failed to read file: {e}")           # show reason
+        sys.exit(1)                                  # hard exit
+
+    rems = detect_batch(now_vals, met_vals)          # every frame's seconds-until-change in one go
+    if events:
+        render, map_id, ev2c = card_renderer(map_info, args.lane, my_sg), map_info[0], EVENT2COLOR.get
+        last_key = None
+        for inter_id_spat, cur_event, rem_secs in zip(inter_ids, events, rems):
+            key = card_key(map_id or inter_id_spat, ev2c(cur_event, "red"), rem_secs)
+            if key != last_key:                      # identical card: nothing to redraw
+                render(inter_id=key[0], cur_color=key[1], secs_remaining=key[2])
+                last_key = key
+    return map_info, spat_seen, len(events), notes
+
+def card_renderer(map_info, lane, sg):          # draw_card with what stays fixed for the whole run already bound
+    return functools.partial(draw_card, approach_name=map_info[1], lane_id=lane, sg=sg)
+
+def card_key(inter_id, cur_color, secs):        # (inter_id, color, secs) rounded the way the card shows it; NaN -> None
+    return inter_id, cur_color, (None if math.isnan(secs) else round(secs, 1))
+
+def lane_sg(map_info, lane):                    # lane's SG from the MAP, or False after reporting a missing lane
+    lane_info = map_info[2]
+    if lane not in lane_info:                      # ensure lane exists
+        print(f"Lane {lane} not found in MAP. Known lanes: {sorted(lane_info.keys())}")
+        return False
+    return lane_info[lane].get("sg")               # lane's SG
 
 # ---------- main ----------
 def main():                                     # program entry point
@@ -277,57 +724,20 @@ def main():                                     # program entry point
     ap.add_argument("logfile", help="Path to XML log with MapData + SPaT")   # argument for reading in logfile
     ap.add_argument("--lane", type=int, required=True, help="Your lane ID (from MAP)")  # required lane ID input from user
     ap.add_argument("--rate", type=float, default=0.5, help="Pause between frames (seconds, default 0.5)")  # optional refresh rate
+    ap.add_argument("--offline", action="store_true", help="Batch mode: decode the whole log first, then show every frame without pausing")
     args = ap.parse_args()                         # parse CLI args
 
-    try:
-        text = open(args.logfile, "r", encoding="utf-8", errors="ignore").read()  # read whole file
-    except Exception as e:                        # file error?
-        print(f"Failed to read file: {e}")        # show reason
-        sys.exit(1)                               # hard exit
-
-    map_blocks = parse_map_blocks(text)           # slice out all MAP blocks
-    if not map_blocks:                            # none found?
-        print("No MapData found in file."); return
-    inter_id_map, inter_name_map, lane_info = parse_map(map_blocks[0])  # parse first MAP
-
-    if args.lane not in lane_info:                # ensure lane exists
-        print(f"Lane {args.lane} not found in MAP. Known lanes: {sorted(lane_info.keys())}")
+    result = run_offline(args) if args.offline else run_live(args)
+    if result is None:                             # already reported (e.g. lane not in MAP)
         return
-    my_sg = lane_info[args.lane].get("sg")        # lane's SG
+    map_info, spat_seen, shown, notes = result
+    for note in notes:                             # warnings held back so the cards didn't erase them
+        print(note)
 
-    spat_blocks = parse_spat_blocks(text)         # slice out all SPaT blocks
-    if not spat_blocks:                           # none found?
+    if map_info is None:                          # no MAP anywhere?
+        print("No MapData found in file."); return
+    if not spat_seen:                             # no SPaT at all?
         print("No SPaT found in file."); return
-
-    shown = 0                                     # used to count the frames shown
-    for blob in spat_blocks:                      # iterate each SPaT frame
-        try:
-            root = ET.fromstring(blob)            # parse SPaT XML
-        except ET.ParseError:
-            continue                              # skip if bad frame
-        inter_id_spat, now_val, states = parse_spat(root)  # decode SPaT content
-        if not states:                            # skip if empty frame
-            continue
-
-        cur_event, rem_secs = None, None          # defaults for this frame
-        for st in states:                         # search for our SG
-            if st["sg"] == my_sg:                 # found our SG
-                cur_event = st["event"]           # current event name
-                rem_secs  = detect_unit_and_delta(now_val, st["minEndRaw"])  # seconds until change
-                break                              # stop searching
-
-        cur_color = EVENT2COLOR.get(cur_event, "red")  # map event to color (default red)
-        draw_card(                                   # draw out the card for this frame
-            approach_name=inter_name_map,            # intersection name (if available)
-            inter_id=(inter_id_map or inter_id_spat),# prefer interID from MAP, else use SPaT's
-            lane_id=args.lane,                       # your lane
-            sg=my_sg,                                # your signal group
-            cur_color=cur_color,                     # current color
-            secs_remaining=rem_secs if isinstance(rem_secs, (int, float)) else None,  # seconds (or None)
-        )
-        shown += 1                                   # go to the next frame
-        time.sleep(max(0.05, args.rate))            # pause at rate or 0.05 seconds (whichever is greater)
-
     if shown == 0:                                   # print the following if no SG found for the user's lane
         print("SPaT frames found, but none referenced your lane's signal group.")
 